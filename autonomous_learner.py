@@ -1,8 +1,21 @@
+import time
+
+# Отсчет времени холодного старта — до импорта библиотеки telegram
+STARTUP_BEGIN = time.perf_counter()
+
+import asyncio
 import logging
 import json
+import multiprocessing
 import os
 import shutil
+import signal
+import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import urlparse
+from pathlib import Path
+from queue import Empty
 from telegram import (
     Update,
     InlineKeyboardButton,
@@ -16,9 +29,13 @@ from telegram.ext import (
     ContextTypes,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
+    BasePersistence,
+    PersistenceInput,
     filters,
     ConversationHandler
 )
+from telegram.error import BadRequest
 
 # Настройка логгирования
 logging.basicConfig(
@@ -31,10 +48,68 @@ logger = logging.getLogger(__name__)
 ROLE_SELECTION, REPORT_PHOTO, REPORT_TEXT, UPLOAD_NEXT_LESSON = range(4)
 
 # Инициализация данных
-DATA_FILE = 'b21ot_data.json'
+DB_FILE = 'b21ot_data.sqlite3'
+DATA_FILE = 'b21ot_data.json'  # прежний формат, переносится в DB_FILE при первом запуске
 LESSONS_DIR = 'le21ssons'
 REPORTS_DIR = 're21ports'
 
+# Собственный Bot API сервер (telegram-bot-api --local).
+# Без него действуют лимиты облачного API: 20 МБ на скачивание и 50 МБ на загрузку.
+BOT_API_URL = os.environ.get('BOT_API_URL')  # например http://localhost:8081/bot
+BOT_API_FILE_URL = os.environ.get('BOT_API_FILE_URL')  # например http://localhost:8081/file/bot
+BOT_API_LOCAL_MODE = os.environ.get('BOT_API_LOCAL_MODE', '0') == '1'
+BOT_API_LOCAL_TIMEOUT = 300  # большие видео сервер обрабатывает дольше стандартных 5 секунд
+
+# Масштабирование: один процесс принимает обновления и распределяет их
+# по BOT_WORKERS рабочим процессам по id чата.
+# Состояния диалогов лежат в общей базе, так что число процессов можно менять между запусками.
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', '1'))
+# Webhook требует python-telegram-bot[webhooks]. На Heroku порт (PORT) маршрутизируется
+# только процессу типа web: для webhook в Procfile нужен web вместо worker.
+BOT_WEBHOOK_URL = os.environ.get('BOT_WEBHOOK_URL')  # без него используется polling
+BOT_WEBHOOK_PORT = int(os.environ.get('PORT', '8443'))
+WORKER_MIN_UPTIME = 10  # рабочий процесс, упавший быстрее, не перезапускается
+WORKER_STOP_TIMEOUT = 30  # столько ждем, пока рабочий процесс дочитает очередь
+CONVERSATION_TTL = 7 * 24 * 3600  # незаконченный диалог старше недели при запуске не восстанавливается
+
+DB_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    role TEXT,
+    current_lesson INTEGER NOT NULL DEFAULT 1,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS users_role ON users (role, current_lesson);
+CREATE TABLE IF NOT EXISTS lessons (
+    number INTEGER PRIMARY KEY,
+    path TEXT,
+    type TEXT,
+    uploaded_by TEXT,
+    timestamp TEXT,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS reports (
+    lesson INTEGER,
+    idx INTEGER,
+    user_id TEXT,
+    text TEXT,
+    timestamp TEXT,
+    status TEXT,
+    photo TEXT,
+    PRIMARY KEY (lesson, idx)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT,
+    chat_id INTEGER,
+    user_id INTEGER,
+    state INTEGER,
+    updated REAL,
+    PRIMARY KEY (name, chat_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data TEXT);
+'''
+
 # Клавиатуры
 MOTHER_KEYBOARD = ReplyKeyboardMarkup(
     [["📝 Создать урок", "📋 Список уроков", "🔔 Напомнить о задании"]],
@@ -50,17 +125,80 @@ SON_KEYBOARD = ReplyKeyboardMarkup(
 
 
 class BotData:
+    """Хранилище бота в SQLite.
+
+    Каждая запись меняется отдельным запросом, а режим WAL позволяет
+    нескольким процессам читать и писать один файл базы одновременно.
+    """
+    # Соединение открывается лениво и отдельно в каждом процессе
+    _db = None
+    _db_pid = None
+
+    @staticmethod
+    def connect():
+        """Соединение с базой для текущего процесса"""
+        if BotData._db is None or BotData._db_pid != os.getpid():
+            db = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(DB_SCHEMA)
+            BotData._db, BotData._db_pid = db, os.getpid()
+            BotData._import_json()
+        return BotData._db
+
+    @staticmethod
+    @contextmanager
+    def _write():
+        """Транзакция из нескольких запросов; блокирует запись только на время самой транзакции"""
+        db = BotData.connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    @staticmethod
+    def _import_json():
+        """Однократно переносит данные из прежнего JSON-файла"""
+        with BotData._write() as db:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'lesson_counter'").fetchone():
+                return
+
+            data = {'users': {}, 'lessons': {}, 'reports': {}, 'lesson_counter': 1}
+            if os.path.exists(DATA_FILE):
+                with open(DATA_FILE, 'r') as f:
+                    data = json.load(f)
+                logger.info(f"Данные перенесены из {DATA_FILE} в {DB_FILE}")
+
+            db.executemany(
+                'INSERT INTO users (id, role, current_lesson, name) VALUES (?, ?, ?, ?)',
+                [(uid, user.get('role'), user.get('current_lesson', 1), user.get('name'))
+                 for uid, user in data['users'].items()]
+            )
+            db.executemany(
+                'INSERT INTO lessons (number, path, type, uploaded_by, timestamp, size) VALUES (?, ?, ?, ?, ?, ?)',
+                [(int(number), lesson.get('path'), lesson.get('type', 'video'), lesson.get('uploaded_by'),
+                  lesson.get('timestamp'), lesson.get('size'))
+                 for number, lesson in data['lessons'].items()]
+            )
+            db.executemany(
+                'INSERT INTO reports (lesson, idx, user_id, text, timestamp, status, photo) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(int(number), idx, report.get('user_id'), report.get('text'), report.get('timestamp'),
+                  report.get('status'), report.get('photo'))
+                 for number, reports in data['reports'].items() for idx, report in enumerate(reports)]
+            )
+            db.execute("INSERT INTO meta (key, value) VALUES ('lesson_counter', ?)", (data['lesson_counter'],))
+
     @staticmethod
     def reset():
         """Сбрасывает все данные бота"""
-        data = {
-            'users': {},
-            'lessons': {},
-            'reports': {},
-            'lesson_counter': 1
-        }
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        with BotData._write() as db:
+            for table in ['users', 'lessons', 'reports']:
+                db.execute(f'DELETE FROM {table}')
+            db.execute("UPDATE meta SET value = 1 WHERE key = 'lesson_counter'")
 
         for folder in [LESSONS_DIR, REPORTS_DIR]:
             if os.path.exists(folder):
@@ -70,27 +208,226 @@ class BotData:
         logger.info("Все данные сброшены")
 
     @staticmethod
-    def load():
-        """Загружает данные из файла или создает новые"""
-        if not os.path.exists(DATA_FILE):
-            BotData.reset()
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
+    def get_user(user_id):
+        """Данные пользователя или None, если он не выбрал роль"""
+        row = BotData.connect().execute(
+            'SELECT role, current_lesson, name FROM users WHERE id = ?', (user_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def get_role(user_id):
+        user = BotData.get_user(user_id)
+        return user['role'] if user else None
+
+    @staticmethod
+    def users_with_role(role, current_lesson=None):
+        """Пары (id, данные) пользователей с ролью, при необходимости — на заданном уроке"""
+        query = 'SELECT id, role, current_lesson, name FROM users WHERE role = ?'
+        params = [role]
+        if current_lesson is not None:
+            query += ' AND current_lesson = ?'
+            params.append(current_lesson)
+        return [(row['id'], dict(row)) for row in BotData.connect().execute(query, params)]
+
+    @staticmethod
+    def save_user(user_id, role, name):
+        """Регистрирует пользователя с выбранной ролью, начиная с первого урока"""
+        BotData.connect().execute(
+            'INSERT OR REPLACE INTO users (id, role, current_lesson, name) VALUES (?, ?, 1, ?)',
+            (user_id, role, name)
+        )
+
+    @staticmethod
+    def set_current_lesson(user_id, lesson_number):
+        BotData.connect().execute('UPDATE users SET current_lesson = ? WHERE id = ?', (lesson_number, user_id))
+
+    @staticmethod
+    def next_lesson_number():
+        """Выдает номер для нового урока"""
+        with BotData._write() as db:
+            lesson_number = db.execute("SELECT value FROM meta WHERE key = 'lesson_counter'").fetchone()[0]
+            db.execute("UPDATE meta SET value = ? WHERE key = 'lesson_counter'", (lesson_number + 1,))
+        return lesson_number
+
+    @staticmethod
+    def get_lesson(lesson_number):
+        row = BotData.connect().execute(
+            'SELECT path, type, uploaded_by, timestamp, size FROM lessons WHERE number = ?', (lesson_number,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def save_lesson(lesson_number, lesson):
+        BotData.connect().execute(
+            'INSERT OR REPLACE INTO lessons (number, path, type, uploaded_by, timestamp, size) '
+            'VALUES (:number, :path, :type, :uploaded_by, :timestamp, :size)',
+            {'number': lesson_number, **lesson}
+        )
+
+    @staticmethod
+    def lessons():
+        """Все уроки по порядку вместе с числом отчетов"""
+        return [dict(row) for row in BotData.connect().execute(
+            'SELECT number, type, timestamp, '
+            '(SELECT COUNT(*) FROM reports WHERE reports.lesson = lessons.number) AS reports_count '
+            'FROM lessons ORDER BY number'
+        )]
+
+    @staticmethod
+    def add_report(lesson_number, report):
+        """Сохраняет отчет и возвращает его номер среди отчетов урока"""
+        with BotData._write() as db:
+            report_idx = db.execute('SELECT COUNT(*) FROM reports WHERE lesson = ?', (lesson_number,)).fetchone()[0]
+            db.execute(
+                'INSERT INTO reports (lesson, idx, user_id, text, timestamp, status, photo) '
+                'VALUES (:lesson, :idx, :user_id, :text, :timestamp, :status, :photo)',
+                {'lesson': lesson_number, 'idx': report_idx, 'photo': None, **report}
+            )
+        return report_idx
 
     @staticmethod
-    def save(data):
-        """Сохраняет данные в файл"""
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+    def set_report_status(lesson_number, report_idx, status):
+        """Меняет статус отчета; False, если такого отчета нет"""
+        cursor = BotData.connect().execute(
+            'UPDATE reports SET status = ? WHERE lesson = ? AND idx = ?', (status, lesson_number, report_idx)
+        )
+        return cursor.rowcount > 0
+
+
+class SqlitePersistence(BasePersistence):
+    """Состояния диалогов и user_data в общей базе BotData.
+
+    Не привязаны к процессу: после смены BOT_WORKERS чат продолжает диалог
+    в том рабочем процессе, который теперь его обслуживает. chat_data,
+    bot_data и callback_data бот не использует и не хранит.
+
+    Чтобы запуск не зависел от числа пользователей, процесс worker из workers
+    восстанавливает только диалоги своих чатов, не старше CONVERSATION_TTL,
+    а user_data читает лениво, при первом обновлении пользователя.
+    Ключ диалога — (id чата, id пользователя), состояние — число.
+
+    Изменения записываются сразу после каждого обновления (save_state), поэтому
+    убитый процесс теряет только обновления, которые еще не обработал.
+    """
+
+    def __init__(self, worker=0, workers=1):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False))
+        self.worker = worker
+        self.workers = workers
+        self._loaded_users = set()
+
+    async def get_conversations(self, name):
+        cursor = BotData.connect().cursor()
+        cursor.row_factory = None  # кортежи заметно быстрее sqlite3.Row на сотнях тысяч строк
+        # Остаток приводится к неотрицательному, как в worker_for: id групп отрицательные
+        rows = cursor.execute(
+            'SELECT chat_id, user_id, state FROM conversations '
+            'WHERE name = ? AND updated > ? AND ((chat_id % ?) + ?) % ? = ?',
+            (name, time.time() - CONVERSATION_TTL, self.workers, self.workers, self.workers, self.worker)
+        )
+        return {(chat_id, user_id): state for chat_id, user_id, state in rows}
+
+    async def update_conversation(self, name, key, new_state):
+        chat_id, user_id = key
+        db = BotData.connect()
+        if new_state is None:
+            db.execute(
+                'DELETE FROM conversations WHERE name = ? AND chat_id = ? AND user_id = ?', (name, chat_id, user_id)
+            )
+        else:
+            db.execute(
+                'INSERT OR REPLACE INTO conversations (name, chat_id, user_id, state, updated) VALUES (?, ?, ?, ?, ?)',
+                (name, chat_id, user_id, new_state, time.time())
+            )
+
+    async def get_user_data(self):
+        # Загружаются в refresh_user_data, только для тех, кто пишет боту
+        return {}
+
+    async def update_user_data(self, user_id, data):
+        # Незагруженные данные в памяти пусты и не должны затирать сохраненные
+        if user_id not in self._loaded_users:
+            return
+        if not data:
+            await self.drop_user_data(user_id)
+            return
+        BotData.connect().execute(
+            'INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)', (user_id, json.dumps(data))
+        )
+
+    async def drop_user_data(self, user_id):
+        BotData.connect().execute('DELETE FROM user_data WHERE user_id = ?', (user_id,))
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Чат всегда обрабатывается одним процессом: после первой загрузки данные в памяти актуальны
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        row = BotData.connect().execute('SELECT data FROM user_data WHERE user_id = ?', (user_id,)).fetchone()
+        if row:
+            user_data.update(json.loads(row['data']))
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        # При остановке, а не при запуске: удаляем диалоги, которые уже не восстановятся
+        BotData.connect().execute('DELETE FROM conversations WHERE updated <= ?', (time.time() - CONVERSATION_TTL,))
+
+
+async def store_file(tg_file, file_path):
+    """Сохраняет файл Telegram по указанному пути.
+
+    В локальном режиме сервер Bot API возвращает путь к файлу на своем диске:
+    вместо повторного скачивания по HTTP файл жестко связывается с хранилищем,
+    а если это невозможно (другая файловая система) — переносится.
+    """
+    source = tg_file.file_path
+    if BOT_API_LOCAL_MODE and source and os.path.isabs(source) and os.path.exists(source):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        try:
+            os.link(source, file_path)
+        except OSError:
+            shutil.move(source, file_path)
+        return file_path
+
+    await tg_file.download_to_drive(file_path)
+    return file_path
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало работы с ботом, выбор роли"""
-    data = BotData.load()
     user_id = str(update.effective_user.id)
+    user = BotData.get_user(user_id)
 
-    if user_id in data['users']:
-        role = data['users'][user_id]['role']
+    if user:
+        role = user['role']
         if role == 'mother':
             await update.message.reply_text(
                 "Вы зарегистрированы как 👩 Матушка",
@@ -101,7 +438,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
                 "Вы зарегистрированы как 👦 Сын матушки",
                 reply_markup=SON_KEYBOARD
             )
-            await show_son_status(update.message, data, user_id)
+            await show_son_status(update.message, user_id)
         return ConversationHandler.END
 
     keyboard = [
@@ -115,12 +452,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ROLE_SELECTION
 
 
-async def show_son_status(message, data, user_id):
+async def show_son_status(message, user_id):
     """Показывает статус для сына"""
-    current_lesson = data['users'][user_id].get('current_lesson', 1)
-    lesson_key = str(current_lesson)
+    current_lesson = BotData.get_user(user_id)['current_lesson']
 
-    if lesson_key in data['lessons']:
+    if BotData.get_lesson(current_lesson):
         message_text = "Урок доступен! Используйте кнопку '🎬 Получить урок'"
     else:
         message_text = f"Урок #{current_lesson} еще не загружен."
@@ -138,14 +474,8 @@ async def role_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     user_id = str(query.from_user.id)
     role = query.data
-    data = BotData.load()
 
-    data['users'][user_id] = {
-        'role': role,
-        'current_lesson': 1,
-        'name': query.from_user.full_name
-    }
-    BotData.save(data)
+    BotData.save_user(user_id, role, query.from_user.full_name)
 
     if role == 'mother':
         await query.message.reply_text(
@@ -159,23 +489,20 @@ async def role_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "Используйте кнопки ниже для управления:",
             reply_markup=SON_KEYBOARD
         )
-        await show_son_status(query.message, data, user_id)
+        await show_son_status(query.message, user_id)
 
     return ConversationHandler.END
 
 
 async def request_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Создание нового урока"""
-    data = BotData.load()
     user_id = str(update.effective_user.id)
 
-    if data['users'].get(user_id, {}).get('role') != 'mother':
+    if BotData.get_role(user_id) != 'mother':
         await update.message.reply_text("❌ Только матери могут создавать уроки!", reply_markup=MOTHER_KEYBOARD)
         return ConversationHandler.END
 
-    lesson_number = data['lesson_counter']
-    data['lesson_counter'] += 1
-    BotData.save(data)
+    lesson_number = BotData.next_lesson_number()
 
     lesson_dir = os.path.join(LESSONS_DIR, str(lesson_number))
     os.makedirs(lesson_dir, exist_ok=True)
@@ -195,7 +522,6 @@ async def handle_lesson_media(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ Пожалуйста, отправьте видео или фото")
         return UPLOAD_NEXT_LESSON
 
-    data = BotData.load()
     lesson_number = context.user_data.get('uploading_lesson')
 
     if not lesson_number:
@@ -206,41 +532,51 @@ async def handle_lesson_media(update: Update, context: ContextTypes.DEFAULT_TYPE
     lesson_dir = os.path.join(LESSONS_DIR, str(lesson_number))
     file_path = None
 
-    if update.message.video:
-        video = update.message.video
-        file_path = os.path.join(lesson_dir, 'lesson.mp4')
-        await (await video.get_file()).download_to_drive(file_path)
-        media_type = 'video'
-    else:
-        photo = update.message.photo[-1]  # Берем самое качественное фото
-        file_path = os.path.join(lesson_dir, 'lesson.jpg')
-        await (await photo.get_file()).download_to_drive(file_path)
-        media_type = 'photo'
+    try:
+        if update.message.video:
+            video = update.message.video
+            file_path = os.path.join(lesson_dir, 'lesson.mp4')
+            await store_file(await video.get_file(), file_path)
+            media_type = 'video'
+        else:
+            photo = update.message.photo[-1]  # Берем самое качественное фото
+            file_path = os.path.join(lesson_dir, 'lesson.jpg')
+            await store_file(await photo.get_file(), file_path)
+            media_type = 'photo'
+    except BadRequest as e:
+        logger.error(f"Ошибка загрузки материалов урока #{lesson_number}: {e}")
+        # Облачный Bot API не отдает файлы больше 20 МБ, остальные ошибки не скрываем
+        if BOT_API_LOCAL_MODE or 'file is too big' not in e.message.lower():
+            raise
+        await update.message.reply_text(
+            "❌ Не удалось загрузить файл. Если он больше 20 МБ, "
+            "боту нужен локальный Bot API сервер (BOT_API_LOCAL_MODE=1).\n"
+            "Попробуйте отправить файл поменьше:"
+        )
+        return UPLOAD_NEXT_LESSON
 
     # Сохраняем информацию об уроке
-    data['lessons'][str(lesson_number)] = {
+    BotData.save_lesson(lesson_number, {
         'path': file_path,
         'type': media_type,
         'uploaded_by': str(update.effective_user.id),
         'timestamp': datetime.now().isoformat(),
         'size': os.path.getsize(file_path)
-    }
-    BotData.save(data)
+    })
 
     # Уведомляем сыновей
     sons_notified = 0
-    for uid, user_data in data['users'].items():
-        if user_data.get('role') == 'son' and user_data.get('current_lesson') == lesson_number:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(uid),
-                    text=f"🎉 Урок #{lesson_number} готов!\n"
-                         "Используйте кнопку '🎬 Получить урок', чтобы получить материалы.",
-                    reply_markup=SON_KEYBOARD
-                )
-                sons_notified += 1
-            except Exception as e:
-                logger.error(f"Ошибка уведомления пользователя {uid}: {e}")
+    for uid, user_data in BotData.users_with_role('son', current_lesson=lesson_number):
+        try:
+            await context.bot.send_message(
+                chat_id=int(uid),
+                text=f"🎉 Урок #{lesson_number} готов!\n"
+                     "Используйте кнопку '🎬 Получить урок', чтобы получить материалы.",
+                reply_markup=SON_KEYBOARD
+            )
+            sons_notified += 1
+        except Exception as e:
+            logger.error(f"Ошибка уведомления пользователя {uid}: {e}")
 
     await update.message.reply_text(
         f"✅ Урок #{lesson_number} успешно загружен!\n"
@@ -252,15 +588,15 @@ async def handle_lesson_media(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def get_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка урока ученику"""
-    data = BotData.load()
     user_id = str(update.effective_user.id)
+    user = BotData.get_user(user_id)
 
-    if data['users'].get(user_id, {}).get('role') != 'son':
+    if not user or user['role'] != 'son':
         await update.message.reply_text("❌ Только сыновья могут получать уроки!", reply_markup=SON_KEYBOARD)
         return
 
-    current_lesson = data['users'][user_id].get('current_lesson', 1)
-    lesson = data['lessons'].get(str(current_lesson))
+    current_lesson = user['current_lesson']
+    lesson = BotData.get_lesson(current_lesson)
     if not lesson:
         keyboard = [[InlineKeyboardButton("📞 Уведомить маму", callback_data='notify_mother')]]
         await update.message.reply_text(
@@ -273,20 +609,19 @@ async def get_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Отправляем файл в зависимости от типа
         if lesson.get('type', 'video') == 'video':
             await update.message.reply_video(
-                video=open(lesson['path'], 'rb'),
+                video=Path(lesson['path']),
                 caption=f"🎬 Урок #{current_lesson}",
                 reply_markup=ReplyKeyboardRemove()
             )
         else:
             await update.message.reply_photo(
-                photo=open(lesson['path'], 'rb'),
+                photo=Path(lesson['path']),
                 caption=f"📸 Урок #{current_lesson}",
                 reply_markup=ReplyKeyboardRemove()
             )
 
         # Обновляем текущий урок для ученика
-        data['users'][user_id]['current_lesson'] = current_lesson + 1
-        BotData.save(data)
+        BotData.set_current_lesson(user_id, current_lesson + 1)
 
         # Сохраняем номер урока для будущего отчета
         context.user_data['last_lesson'] = current_lesson
@@ -309,9 +644,8 @@ async def notify_mother(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    data = BotData.load()
     user_id = str(query.from_user.id)
-    user_data = data['users'].get(user_id, {})
+    user_data = BotData.get_user(user_id) or {}
 
     if user_data.get('role') != 'son':
         await query.edit_message_text(
@@ -321,12 +655,12 @@ async def notify_mother(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     current_lesson = user_data.get('current_lesson', 1)
-    son_name = user_data.get('name', 'Сын')
-    mothers = [uid for uid, udata in data['users'].items() if udata.get('role') == 'mother']
+    son_name = user_data.get('name') or 'Сын'  # у перенесенных из JSON пользователей имени может не быть
+    mothers = [uid for uid, _ in BotData.users_with_role('mother')]
 
     # Проверяем статус урока
     lesson_status = "еще не загружен"
-    if str(current_lesson) in data['lessons']:
+    if BotData.get_lesson(current_lesson):
         lesson_status = "уже загружен"
 
     notification_sent = False
@@ -365,15 +699,14 @@ async def notify_mother(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def remind_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Напоминание сыну о задании"""
-    data = BotData.load()
     user_id = str(update.effective_user.id)
 
-    if data['users'].get(user_id, {}).get('role') != 'mother':
+    if BotData.get_role(user_id) != 'mother':
         await update.message.reply_text("❌ Только матери могут напоминать о заданиях!", reply_markup=MOTHER_KEYBOARD)
         return
 
     # Находим всех сыновей
-    sons = [(uid, udata) for uid, udata in data['users'].items() if udata.get('role') == 'son']
+    sons = BotData.users_with_role('son')
     if not sons:
         await update.message.reply_text("❌ Нет зарегистрированных сыновей!", reply_markup=MOTHER_KEYBOARD)
         return
@@ -400,28 +733,27 @@ async def remind_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def list_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список всех уроков"""
-    data = BotData.load()
     user_id = str(update.effective_user.id)
 
-    if data['users'].get(user_id, {}).get('role') != 'mother':
+    if BotData.get_role(user_id) != 'mother':
         await update.message.reply_text("❌ Только матери могут просматривать список уроков!",
                                         reply_markup=MOTHER_KEYBOARD)
         return
 
-    if not data['lessons']:
+    lessons = BotData.lessons()
+    if not lessons:
         await update.message.reply_text("ℹ️ Пока нет ни одного урока.", reply_markup=MOTHER_KEYBOARD)
         return
 
     lessons_text = "📚 Список уроков:\n\n"
-    for lesson_num, lesson_data in sorted(data['lessons'].items(), key=lambda x: int(x[0])):
+    for lesson_data in lessons:
         dt = datetime.fromisoformat(lesson_data['timestamp'])
-        media_type = "🎬 Видео" if lesson_data.get('type') == 'video' else "📸 Фото"
-        reports_count = len(data['reports'].get(lesson_num, []))
+        media_type = "🎬 Видео" if lesson_data['type'] == 'video' else "📸 Фото"
 
         lessons_text += (
-            f"🔢 Урок #{lesson_num} ({media_type})\n"
+            f"🔢 Урок #{lesson_data['number']} ({media_type})\n"
             f"⏰ {dt.strftime('%d.%m.%Y %H:%M')}\n"
-            f"📊 Отчетов: {reports_count}\n\n"
+            f"📊 Отчетов: {lesson_data['reports_count']}\n\n"
         )
 
     await update.message.reply_text(lessons_text, reply_markup=MOTHER_KEYBOARD)
@@ -429,8 +761,6 @@ async def list_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def request_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Запрос отчета по уроку"""
-    data = BotData.load()
-
     # Определяем, откуда пришел запрос (сообщение или callback)
     if update.callback_query:
         query = update.callback_query
@@ -441,14 +771,15 @@ async def request_report(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         user_id = str(update.effective_user.id)
         message = update.message
 
-    if data['users'].get(user_id, {}).get('role') != 'son':
+    user = BotData.get_user(user_id)
+    if not user or user['role'] != 'son':
         await message.reply_text("❌ Только сыновья могут сдавать отчеты!", reply_markup=SON_KEYBOARD)
         return ConversationHandler.END
 
     # Получаем последний пройденный урок
     last_lesson = context.user_data.get('last_lesson')
     if not last_lesson:
-        current_lesson = data['users'][user_id].get('current_lesson', 1) - 1
+        current_lesson = user['current_lesson'] - 1
         if current_lesson < 1:
             await message.reply_text("❌ У вас нет активных уроков для сдачи отчета", reply_markup=SON_KEYBOARD)
             return ConversationHandler.END
@@ -500,7 +831,7 @@ async def handle_report_photo(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     photo = update.message.photo[-1]
     file_path = os.path.join(report_dir, f"{user_id}.jpg")
-    await (await photo.get_file()).download_to_drive(file_path)
+    await store_file(await photo.get_file(), file_path)
 
     await save_report(context, user_id, lesson_number, text, file_path, update.effective_user.full_name)
 
@@ -514,12 +845,6 @@ async def handle_report_photo(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def save_report(context: ContextTypes.DEFAULT_TYPE, user_id: str, lesson_number: int,
                       text: str, photo_path: str, user_name: str):
     """Сохраняет отчет и уведомляет мать"""
-    data = BotData.load()
-
-    # Сохраняем отчет
-    if str(lesson_number) not in data['reports']:
-        data['reports'][str(lesson_number)] = []
-
     report = {
         'user_id': user_id,
         'text': text,
@@ -530,12 +855,11 @@ async def save_report(context: ContextTypes.DEFAULT_TYPE, user_id: str, lesson_n
     if photo_path:
         report['photo'] = photo_path
 
-    data['reports'][str(lesson_number)].append(report)
-    report_idx = len(data['reports'][str(lesson_number)]) - 1
-    BotData.save(data)
+    # Сохраняем отчет
+    report_idx = BotData.add_report(lesson_number, report)
 
     # Уведомляем маму
-    mothers = [uid for uid, udata in data['users'].items() if udata.get('role') == 'mother']
+    mothers = [uid for uid, _ in BotData.users_with_role('mother')]
     for mother_id in mothers:
         try:
             message_text = (
@@ -554,7 +878,7 @@ async def save_report(context: ContextTypes.DEFAULT_TYPE, user_id: str, lesson_n
             if photo_path:
                 await context.bot.send_photo(
                     chat_id=int(mother_id),
-                    photo=open(photo_path, 'rb'),
+                    photo=Path(photo_path),
                     caption=message_text,
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
@@ -577,24 +901,19 @@ async def handle_report_review(update: Update, context: ContextTypes.DEFAULT_TYP
     lesson_number = int(lesson_number)
     report_idx = int(report_idx)
 
-    data = BotData.load()
-
-    # Обновляем статус отчета
-    if str(lesson_number) not in data['reports'] or report_idx >= len(data['reports'][str(lesson_number)]):
-        await query.answer("❌ Ошибка: отчет не найден", show_alert=True)
-        return
-
-    report = data['reports'][str(lesson_number)][report_idx]
     if action == 'approve':
-        report['status'] = 'approved'
+        status = 'approved'
         status_text = "✅ принят"
         son_message = f"🎉 Мама приняла твой отчет по уроку #{lesson_number}!"
     else:
-        report['status'] = 'rejected'
+        status = 'rejected'
         status_text = "❌ отклонен"
         son_message = f"😢 Мама отклонила твой отчет по уроку #{lesson_number}.\nПожалуйста, переделай задание и отправь отчет заново."
 
-    BotData.save(data)
+    # Обновляем статус отчета
+    if not BotData.set_report_status(lesson_number, report_idx, status):
+        await query.answer("❌ Ошибка: отчет не найден", show_alert=True)
+        return
 
     # Уведомляем сына
     try:
@@ -631,8 +950,7 @@ async def cancel_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = str(update.effective_user.id)
         message = update.message
 
-    data = BotData.load()
-    role = data['users'].get(user_id, {}).get('role')
+    role = BotData.get_role(user_id)
 
     if role == 'mother':
         reply_markup = MOTHER_KEYBOARD
@@ -656,24 +974,61 @@ async def check_availability(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
 
-    data = BotData.load()
     user_id = str(query.from_user.id)
 
-    if data['users'].get(user_id, {}).get('role') != 'son':
+    if BotData.get_role(user_id) != 'son':
         await query.edit_message_text("❌ Только сыновья могут проверять уроки!", reply_markup=SON_KEYBOARD)
         return
 
-    current_lesson = data['users'][user_id].get('current_lesson', 1)
-    await show_son_status(query.message, data, user_id)
+    await show_son_status(query.message, user_id)
 
 
-def main() -> None:
-    """Запуск бота"""
-    # Создаем папки если их нет
-    for folder in [LESSONS_DIR, REPORTS_DIR]:
-        os.makedirs(folder, exist_ok=True)
+async def post_init(application: Application) -> None:
+    """Открывает хранилище до приема обновлений"""
+    started = time.perf_counter()
+    BotData.connect()
+    logger.info(f"Хранилище открыто за {time.perf_counter() - started:.3f} с")
 
-    application = Application.builder().token("8159436992:AAEKdGBdxVU4TbLuGDCdHpXW8HhzeZecBPY").build()
+
+first_update_logged = False
+
+
+async def log_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Фиксирует время от запуска процесса до первого обработанного обновления"""
+    global first_update_logged
+    if first_update_logged:
+        return
+    first_update_logged = True
+    logger.info(f"Первое обновление обработано через {time.perf_counter() - STARTUP_BEGIN:.3f} с после запуска")
+
+
+async def save_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сохраняет состояние диалога и user_data, не дожидаясь периодической записи"""
+    if update.effective_user:
+        # Application отмечает пользователя только после всех обработчиков
+        context.application.mark_data_for_update_persistence(user_ids=update.effective_user.id)
+    await context.application.update_persistence()
+
+
+def make_builder():
+    """Настройки подключения к Bot API"""
+    builder = Application.builder().token("8159436992:AAEKdGBdxVU4TbLuGDCdHpXW8HhzeZecBPY")
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+        builder = builder.base_file_url(BOT_API_FILE_URL or BOT_API_URL.rsplit('/bot', 1)[0] + '/file/bot')
+    if BOT_API_LOCAL_MODE:
+        # Файлы передаются по локальным путям, без лимитов на размер
+        builder = builder.local_mode(True)
+        builder = builder.read_timeout(BOT_API_LOCAL_TIMEOUT).write_timeout(BOT_API_LOCAL_TIMEOUT)
+    return builder
+
+
+def build_application(builder, worker=0, workers=1):
+    """Создает приложение со всеми обработчиками бота (для рабочего процесса worker из workers)"""
+    # Диалоги переживают перезапуск: пользователь продолжает с того же шага
+    builder = builder.persistence(SqlitePersistence(worker, workers))
+    builder = builder.post_init(post_init)
+    application = builder.build()
 
     # Обработчики команд и сообщений
     conv_handler = ConversationHandler(
@@ -695,7 +1050,9 @@ def main() -> None:
             MessageHandler(filters.Regex('^Отмена$'), cancel_action),
             CallbackQueryHandler(cancel_action, pattern='^cancel_report$')
         ],
-        per_message=False
+        per_message=False,
+        name='main_conversation',
+        persistent=True
     )
 
     application.add_handler(conv_handler)
@@ -710,7 +1067,168 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(check_availability, pattern='^check_availability$'))
     application.add_handler(CallbackQueryHandler(handle_report_review, pattern='^(approve|reject)_\d+_\d+_\d+$'))
 
-    application.run_polling()
+    # Выполняется после основных обработчиков
+    application.add_handler(TypeHandler(Update, log_first_update), group=1)
+    application.add_handler(TypeHandler(Update, save_state), group=2)
+
+    return application
+
+
+def run_ingress(application):
+    """Прием обновлений: webhook, если задан BOT_WEBHOOK_URL, иначе polling"""
+    if BOT_WEBHOOK_URL:
+        if 'PORT' not in os.environ:
+            logger.warning(f"PORT не задан, webhook слушает порт {BOT_WEBHOOK_PORT}")
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=BOT_WEBHOOK_PORT,
+            url_path=urlparse(BOT_WEBHOOK_URL).path.lstrip('/'),
+            webhook_url=BOT_WEBHOOK_URL
+        )
+    else:
+        application.run_polling()
+
+
+def worker_for(update, workers):
+    """Номер рабочего процесса, который ведет чат обновления"""
+    chat = update.effective_chat or update.effective_user
+    return chat.id % workers if chat else 0
+
+
+async def dispatch_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Передает обновление рабочему процессу, который ведет этот чат"""
+    queues = context.bot_data['worker_queues']
+    index = worker_for(update, len(queues))
+    if check_worker(context.application, index):
+        queues[index].put(update.to_dict())
+
+
+def run_worker(index, updates, ingress_pid):
+    """Рабочий процесс: обрабатывает обновления своей доли чатов"""
+    # Остановкой управляет принимающий процесс, иначе очередь не дочитается
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    application = build_application(make_builder().updater(None), index, BOT_WORKERS)
+    asyncio.run(serve_worker(application, updates, ingress_pid))
+
+
+async def serve_worker(application, updates, ingress_pid):
+    """Цикл рабочего процесса: читает обновления из очереди до сигнала остановки"""
+    loop = asyncio.get_running_loop()
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    while True:
+        try:
+            payload = await loop.run_in_executor(None, updates.get, True, 1)
+        except Empty:
+            # Принимающий процесс убит без штатной остановки — не остаемся сиротой
+            if os.getppid() != ingress_pid:
+                logger.error("Принимающий процесс завершился, рабочий процесс останавливается")
+                break
+            continue
+        if payload is None:
+            break
+        await application.update_queue.put(Update.de_json(payload, application.bot))
+
+    await application.stop()
+    await application.shutdown()
+
+
+def start_worker(index, updates):
+    """Запускает рабочий процесс и возвращает его вместе со временем запуска"""
+    worker = multiprocessing.Process(target=run_worker, args=(index, updates, os.getpid()), name=f'worker-{index}')
+    worker.start()
+    return worker, time.monotonic()
+
+
+def check_worker(application, index):
+    """Перезапускает рабочий процесс, если он упал.
+
+    Процесс, упавший сразу после запуска (например, не прошел getMe),
+    перезапускать бессмысленно — тогда останавливается весь бот и
+    возвращается False.
+    """
+    workers = application.bot_data['workers']
+    queues = application.bot_data['worker_queues']
+    worker, started_at = workers[index]
+    if worker.is_alive():
+        return True
+
+    if time.monotonic() - started_at < WORKER_MIN_UPTIME:
+        if not application.bot_data.get('workers_failed'):
+            logger.error(f"Рабочий процесс {index} завершился при запуске (код {worker.exitcode}), бот останавливается")
+            application.bot_data['workers_failed'] = True
+            application.stop_running()
+        return False
+
+    # Процесс, убитый во время чтения, оставляет очередь заблокированной — нужна новая
+    lost = queues[index].qsize()
+    queues[index].cancel_join_thread()
+    queues[index] = multiprocessing.Queue()
+    logger.error(f"Рабочий процесс {index} завершился (код {worker.exitcode}), перезапуск. "
+                 f"Потеряно обновлений из его очереди: {lost}")
+    workers[index] = start_worker(index, queues[index])
+    return True
+
+
+async def supervise_workers(application):
+    """Раз в секунду проверяет рабочие процессы, даже если обновлений нет"""
+    while True:
+        await asyncio.sleep(1)
+        for index in range(len(application.bot_data['workers'])):
+            if not check_worker(application, index):
+                return
+
+
+async def start_supervisor(application: Application) -> None:
+    application.bot_data['supervisor'] = asyncio.create_task(supervise_workers(application))
+
+
+async def stop_supervisor(application: Application) -> None:
+    application.bot_data['supervisor'].cancel()
+
+
+def run_workers():
+    """Принимающий процесс и BOT_WORKERS рабочих процессов"""
+    # База создается до запуска рабочих, чтобы они не переносили JSON одновременно
+    BotData.connect()
+
+    queues = [multiprocessing.Queue() for _ in range(BOT_WORKERS)]
+    workers = [start_worker(index, queue) for index, queue in enumerate(queues)]
+
+    application = make_builder().post_init(start_supervisor).post_stop(stop_supervisor).build()
+    application.bot_data['worker_queues'] = queues
+    application.bot_data['workers'] = workers
+    application.add_handler(TypeHandler(Update, dispatch_update))
+    logger.info(f"Запущено рабочих процессов: {BOT_WORKERS}")
+
+    try:
+        run_ingress(application)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker, _ in workers:
+            worker.join(WORKER_STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+
+    if application.bot_data.get('workers_failed'):
+        raise SystemExit(1)
+
+
+def main() -> None:
+    """Запуск бота"""
+    logger.info(f"Модули импортированы за {time.perf_counter() - STARTUP_BEGIN:.3f} с")
+
+    if BOT_WORKERS > 1:
+        run_workers()
+        return
+
+    application = build_application(make_builder())
+    run_ingress(application)
     logger.info("Бот запущен")
 
 
@@ -0,0 +1,90 @@
+"""Замер холодного старта: время от запуска процесса бота до первого обработанного обновления.
+
+Бот запускается против поддельного Bot API с хранилищем на --records пользователей,
+у каждого из которых есть незаконченный диалог и user_data. Первый запуск переносит
+JSON в SQLite, следующие открывают готовую базу.
+
+    python tests/bench_cold_start.py --records 100000 --runs 3 [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+from fake_bot_api import FakeBotApi, spawn_bot, stop_bot
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autonomous_learner import DB_FILE, DB_SCHEMA, REPORT_TEXT
+
+NEW_USERS = 10 ** 9  # не зарегистрированы: /start отвечает выбором роли
+
+
+def write_store(workdir, records):
+    users = {
+        str(uid): {'role': 'son', 'current_lesson': uid % 10 + 1, 'name': f'user {uid}'}
+        for uid in range(1, records + 1)
+    }
+    data = {'users': users, 'lessons': {}, 'reports': {}, 'lesson_counter': 1}
+    with open(os.path.join(workdir, 'b21ot_data.json'), 'w') as f:
+        json.dump(data, f, indent=2)
+
+    # Все пользователи посреди сдачи отчета — худший случай для восстановления
+    db = sqlite3.connect(os.path.join(workdir, DB_FILE))
+    db.executescript(DB_SCHEMA)
+    now = time.time()
+    with db:
+        db.executemany(
+            'INSERT INTO conversations (name, chat_id, user_id, state, updated) VALUES (?, ?, ?, ?, ?)',
+            [('main_conversation', uid, uid, REPORT_TEXT, now) for uid in range(1, records + 1)]
+        )
+        db.executemany(
+            'INSERT INTO user_data (user_id, data) VALUES (?, ?)',
+            [(uid, json.dumps({'last_lesson': uid % 10 + 1, 'report_lesson': uid % 10 + 1}))
+             for uid in range(1, records + 1)]
+        )
+    db.close()
+
+
+async def measure_run(api, workdir, user_id, workers):
+    """Запускает бота с ожидающим /start и возвращает время до ответа"""
+    api.send_text(user_id, '/start')
+    started = time.perf_counter()
+    process = await spawn_bot(api, workdir, BOT_WORKERS=str(workers))
+    try:
+        await api.wait_for(lambda: api.sent(chat_id=user_id), timeout=60)
+        elapsed = time.perf_counter() - started
+    finally:
+        await stop_bot(process)
+    return elapsed
+
+
+def logged_timings(workdir):
+    with open(os.path.join(workdir, 'bot.log'), encoding='utf-8') as f:
+        log = f.read()
+    return [float(t) for t in re.findall(r'Первое обновление обработано через ([\d.]+) с', log)]
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        write_store(workdir, args.records)
+        async with FakeBotApi(os.path.join(workdir, 'api')) as api:
+            results = [await measure_run(api, workdir, NEW_USERS + run, args.workers) for run in range(args.runs)]
+        logged = logged_timings(workdir)
+
+    print(f'records: {args.records}, workers: {args.workers}')
+    for run, elapsed in enumerate(results, 1):
+        inside = f', по логу бота {logged[run - 1]:.3f} s' if run <= len(logged) else ''
+        print(f'run {run}: первый ответ через {elapsed:.3f} s{inside}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,150 @@
+"""Замер пропускной способности при 1, 2, 4... рабочих процессах.
+
+Бот запускается против поддельного Bot API, у которого каждый вызов отвечает
+с задержкой --latency (как настоящий API по сети). Каждый чат проходит диалог
+/start → выбор роли → «Получить урок» → «Сдать отчет». Выбор роли срабатывает
+только в процессе, который хранит состояние диалога этого чата, поэтому
+завершенный диалог во всех чатах подтверждает, что обновления каждого чата
+попадали в один и тот же процесс.
+
+--cpu-ms добавляет каждому обновлению столько процессорной работы (сериализация
+JSON) в рабочем процессе — это нагрузка, ради которой процессы и добавляются.
+Кроме времени, замеряется процессорное время на обновление у принимающего
+процесса и у рабочих: по нему видно, где упрется масштабирование, если ядер
+больше, чем на машине с замером.
+
+    python tests/bench_workers.py --workers 1 2 4 --chats 200 --latency 0 --cpu-ms 5
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fake_bot_api import FakeBotApi, ROLE_REPLY, spawn_bot, stop_bot
+
+REPLIES_PER_CHAT = 5
+UPDATES_PER_CHAT = 4
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def send_dialog(api, chat_id):
+    api.send_text(chat_id, '/start')
+    api.press_button(chat_id, 'son')
+    api.send_text(chat_id, '🎬 Получить урок')
+    api.send_text(chat_id, '📝 Сдать отчет')
+
+
+def dialog_finished(api, chats):
+    sent = {}
+    for params in api.sent():
+        sent[int(params['chat_id'])] = sent.get(int(params['chat_id']), 0) + 1
+    return all(sent.get(chat_id, 0) >= REPLIES_PER_CHAT for chat_id in chats)
+
+
+def cpu_seconds(pid):
+    """Процессорное время процесса (user + system)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def cpu_usage(ingress_pid):
+    """Процессорное время принимающего процесса и суммарное — его рабочих процессов"""
+    workers = set()
+    for path in glob.glob(f'/proc/{ingress_pid}/task/*/children'):
+        with open(path) as f:
+            workers.update(int(pid) for pid in f.read().split())
+    return cpu_seconds(ingress_pid), sum(cpu_seconds(pid) for pid in workers)
+
+
+async def measure(workers, chats, latency, cpu_ms):
+    with tempfile.TemporaryDirectory() as workdir:
+        async with FakeBotApi(os.path.join(workdir, 'api'), latency=latency) as api:
+            argv = (os.path.abspath(__file__), '--run-bot', '--cpu-ms', str(cpu_ms))
+            process = await spawn_bot(api, workdir, argv=argv, BOT_WORKERS=str(workers))
+            try:
+                # Прогрев: по чату на каждый процесс, чтобы исключить время запуска
+                warmup = list(range(1, workers + 1))
+                for chat_id in warmup:
+                    api.send_text(chat_id, '/start')
+                await api.wait_for(lambda: all(api.sent(chat_id=chat_id) for chat_id in warmup), timeout=60)
+
+                chat_ids = list(range(1000, 1000 + chats))
+                cpu_before = cpu_usage(process.pid)
+                started = time.perf_counter()
+                for chat_id in chat_ids:
+                    send_dialog(api, chat_id)
+                await api.wait_for(lambda: dialog_finished(api, chat_ids), timeout=600)
+                elapsed = time.perf_counter() - started
+                cpu_after = cpu_usage(process.pid)
+
+                misrouted = [chat_id for chat_id in chat_ids if not api.replied(chat_id, ROLE_REPLY)]
+            finally:
+                await stop_bot(process)
+    cpu = [(after - before) / (chats * UPDATES_PER_CHAT) for before, after in zip(cpu_before, cpu_after)]
+    return elapsed, misrouted, cpu
+
+
+def run_bot(cpu_ms):
+    """Запускает бота, добавив каждому обновлению cpu_ms процессорной работы"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import autonomous_learner
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    payload = {'users': {str(uid): {'role': 'son', 'current_lesson': uid % 10} for uid in range(100)}}
+
+    async def cpu_work(update, context):
+        deadline = time.process_time() + cpu_ms / 1000
+        while time.process_time() < deadline:
+            json.loads(json.dumps(payload))
+
+    build_application = autonomous_learner.build_application
+
+    def build_with_cpu_work(*args, **kwargs):
+        application = build_application(*args, **kwargs)
+        application.add_handler(TypeHandler(Update, cpu_work), group=3)
+        return application
+
+    # Рабочие процессы создаются через fork и получают подмененную функцию
+    autonomous_learner.build_application = build_with_cpu_work
+    autonomous_learner.main()
+
+
+async def main(args):
+    print(f'chats: {args.chats}, updates: {args.chats * UPDATES_PER_CHAT}, '
+          f'API latency: {args.latency * 1000:.0f} ms, CPU work: {args.cpu_ms} ms/update, '
+          f'CPUs: {len(os.sched_getaffinity(0))}')
+    baseline = None
+    for workers in args.workers:
+        elapsed, misrouted, (ingress_cpu, workers_cpu) = await measure(workers, args.chats, args.latency, args.cpu_ms)
+        throughput = args.chats * UPDATES_PER_CHAT / elapsed
+        baseline = baseline or throughput
+        line = (f'workers {workers}: {elapsed:.2f} s, {throughput:.0f} updates/s, '
+                f'x{throughput / baseline:.2f}, misrouted chats: {len(misrouted)}')
+        if workers > 1:
+            # С ядром на каждый процесс: рабочие делят обновления, принимающий видит все
+            ceiling = min(workers / workers_cpu, 1 / ingress_cpu)
+            line += (f'; CPU per update: ingress {ingress_cpu * 1000:.2f} ms, '
+                     f'workers {workers_cpu * 1000:.2f} ms; with a core per process: {ceiling:.0f} updates/s')
+        else:
+            line += f'; CPU per update: {ingress_cpu * 1000:.2f} ms'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--cpu-ms', type=float, default=5.0)
+    parser.add_argument('--run-bot', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_bot:
+        run_bot(args.cpu_ms)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# autonomous_learner.py лежит в корне репозитория, а не в пакете
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autonomous_learner import BotData  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Каждый тест работает со своей базой в своей папке"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(BotData, '_db', None)
+    yield tmp_path
+    reopen_db()
+
+
+def reopen_db():
+    """Закрывает соединение с базой, как при перезапуске процесса"""
+    if BotData._db is not None:
+        BotData._db.close()
+    BotData._db = None
@@ -0,0 +1,235 @@
+"""Минимальный Bot API сервер для тестов и замеров.
+
+Подставляется боту через BOT_API_URL / BOT_API_FILE_URL вместо api.telegram.org.
+Поддерживает getMe, getUpdates, getFile, скачивание файлов и отправку сообщений;
+остальные методы отвечают успехом. Все вызовы записываются в FakeBotApi.calls.
+
+Запуск отдельно: python tests/fake_bot_api.py --port 8081 [--local]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+ROLE_REPLY = "Вы выбрали роль: 👦 Сын"  # ответ бота на нажатие кнопки 'son'
+
+
+class FakeBotApi:
+    def __init__(self, files_dir, local_mode=False, latency=0.0, host='127.0.0.1', port=0):
+        self.files_dir = os.path.abspath(files_dir)
+        self.local_mode = local_mode
+        self.latency = latency  # искусственная задержка ответа, как у настоящего API
+        self.host = host
+        self.port = port
+        self.calls = []  # (метод, параметры)
+        self.downloads = []  # пути файлов, скачанных по HTTP
+        self.files = {}
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._runner = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def env(self):
+        """Переменные окружения, направляющие бота на этот сервер"""
+        env = {'BOT_API_URL': f'{self.url}/bot', 'BOT_API_FILE_URL': f'{self.url}/file/bot'}
+        if self.local_mode:
+            env['BOT_API_LOCAL_MODE'] = '1'
+        return env
+
+    async def __aenter__(self):
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route('*', '/bot{token}/{method}', self._handle_method)
+        app.router.add_get('/file/bot{token}/{path:.+}', self._handle_download)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Отпускаем висящие long polling запросы, иначе остановка ждет их таймаута
+        self._new_updates.set()
+        await self._runner.cleanup()
+
+    # Подготовка данных
+
+    def add_file(self, file_id, content, name='file.bin'):
+        """Кладет файл в хранилище сервера, как если бы пользователь его прислал"""
+        path = os.path.join(self.files_dir, file_id, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        self.files[file_id] = path
+        return path
+
+    def add_update(self, **payload):
+        self._updates.append({'update_id': next(self._update_ids), **payload})
+        self._new_updates.set()
+
+    def send_text(self, chat_id, text):
+        """Входящее текстовое сообщение (команды размечаются как bot_command)"""
+        message = self._message(chat_id, user=_user(chat_id), text=text)
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        self.add_update(message=message)
+
+    def send_video(self, chat_id, file_id):
+        video = {'file_id': file_id, 'file_unique_id': file_id, 'width': 640, 'height': 360, 'duration': 1}
+        self.add_update(message=self._message(chat_id, user=_user(chat_id), video=video))
+
+    def press_button(self, chat_id, data):
+        """Нажатие inline-кнопки под сообщением бота"""
+        self.add_update(callback_query={
+            'id': str(next(self._update_ids)),
+            'from': _user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': self._message(chat_id, user=BOT_USER, text='...'),
+        })
+
+    # Проверки
+
+    def sent(self, method='sendMessage', chat_id=None):
+        return [
+            params for name, params in self.calls
+            if name == method and (chat_id is None or int(params['chat_id']) == chat_id)
+        ]
+
+    def replied(self, chat_id, prefix):
+        """Отправлял ли бот в чат сообщение, начинающееся с prefix"""
+        return any(params['text'].startswith(prefix) for params in self.sent(chat_id=chat_id))
+
+    async def wait_for(self, condition, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise TimeoutError('fake Bot API: condition not met in time')
+            await asyncio.sleep(0.01)
+
+    # Обработка запросов
+
+    def _message(self, chat_id, user, **fields):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': f'user {chat_id}'},
+            'from': user,
+            **fields,
+        }
+
+    async def _params(self, request):
+        params = dict(request.query)
+        if request.can_read_body:
+            for key, value in (await request.post()).items():
+                params[key] = value.filename if isinstance(value, web.FileField) else value
+        return params
+
+    async def _handle_method(self, request):
+        method = request.match_info['method']
+        params = await self._params(request)
+        if method == 'getUpdates':
+            return _ok(await self._get_updates(params))
+
+        self.calls.append((method, params))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            return _ok(BOT_USER)
+        if method == 'getFile':
+            return self._get_file(params['file_id'])
+        if method.startswith('send') or method.startswith('edit'):
+            chat_id = int(params.get('chat_id', 0))
+            return _ok(self._message(chat_id, user=BOT_USER, text=params.get('text', '')))
+        return _ok(True)
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get('limit') or 100)]
+
+    def _get_file(self, file_id):
+        path = self.files.get(file_id)
+        if path is None:
+            return web.json_response({'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid file_id'})
+        if not self.local_mode:
+            path = os.path.relpath(path, self.files_dir)
+        return _ok({
+            'file_id': file_id,
+            'file_unique_id': file_id,
+            'file_size': os.path.getsize(self.files[file_id]),
+            'file_path': path,
+        })
+
+    async def _handle_download(self, request):
+        path = os.path.join(self.files_dir, request.match_info['path'])
+        self.downloads.append(path)
+        return web.FileResponse(path)
+
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user {user_id}'}
+
+
+def _ok(result):
+    return web.json_response({'ok': True, 'result': result})
+
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'autonomous_learner.py')
+
+
+async def spawn_bot(api, workdir, argv=(BOT_SCRIPT,), **env):
+    """Запускает бота отдельным процессом в workdir, направив его на api.
+
+    argv — скрипт запуска с аргументами, если бота нужно запустить не напрямую.
+    Вывод бота пишется в workdir/bot.log.
+    """
+    with open(os.path.join(workdir, 'bot.log'), 'ab') as log:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, *argv,
+            cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, **api.env, **env},
+        )
+
+
+async def stop_bot(process, timeout=60):
+    """Штатная остановка бота, как при Ctrl+C"""
+    if process.returncode is None:
+        process.send_signal(signal.SIGINT)
+    return await asyncio.wait_for(process.wait(), timeout)
+
+
+async def _serve(args):
+    async with FakeBotApi(args.files_dir, local_mode=args.local, latency=args.latency, port=args.port) as api:
+        print(' '.join(f'{key}={value}' for key, value in api.env.items()), flush=True)
+        await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--files-dir', default='fake_bot_api_files')
+    parser.add_argument('--local', action='store_true', help='отдавать локальные пути файлов')
+    parser.add_argument('--latency', type=float, default=0.0)
+    asyncio.run(_serve(parser.parse_args()))
+
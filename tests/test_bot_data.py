@@ -0,0 +1,82 @@
+import json
+import multiprocessing
+
+import autonomous_learner
+from autonomous_learner import BotData
+from conftest import reopen_db
+
+
+def take_lesson_numbers(count, results):
+    results.put([BotData.next_lesson_number() for _ in range(count)])
+
+
+def test_imports_legacy_json_once(workdir):
+    data = {
+        'users': {'1': {'role': 'mother', 'current_lesson': 1, 'name': 'Мама'},
+                  '2': {'role': 'son', 'current_lesson': 3, 'name': 'Сын'}},
+        'lessons': {'2': {'path': 'le21ssons/2/lesson.mp4', 'type': 'video', 'uploaded_by': '1',
+                          'timestamp': '2025-06-01T10:00:00', 'size': 10}},
+        'reports': {'2': [{'user_id': '2', 'text': 'готово', 'timestamp': '2025-06-02T10:00:00',
+                           'status': 'approved', 'photo': 're21ports/2/2.jpg'}]},
+        'lesson_counter': 3
+    }
+    (workdir / autonomous_learner.DATA_FILE).write_text(json.dumps(data))
+
+    assert BotData.get_user('2') == {'role': 'son', 'current_lesson': 3, 'name': 'Сын'}
+    assert BotData.lessons() == [{'number': 2, 'type': 'video', 'timestamp': '2025-06-01T10:00:00',
+                                  'reports_count': 1}]
+    assert BotData.next_lesson_number() == 3
+
+    # Повторный запуск не переносит JSON заново
+    reopen_db()
+    assert BotData.next_lesson_number() == 4
+    assert len(BotData.users_with_role('son')) == 1
+
+
+def test_user_and_lesson_records():
+    BotData.save_user('1', 'mother', 'Мама')
+    BotData.save_user('2', 'son', 'Сын')
+    BotData.save_user('3', 'son', 'Второй сын')
+    BotData.set_current_lesson('3', 2)
+
+    assert BotData.get_role('1') == 'mother'
+    assert BotData.get_user('404') is None
+    assert [uid for uid, _ in BotData.users_with_role('son', current_lesson=1)] == ['2']
+
+    BotData.save_lesson(1, {'path': 'lesson.jpg', 'type': 'photo', 'uploaded_by': '1',
+                            'timestamp': '2025-06-01T10:00:00', 'size': 5})
+    assert BotData.get_lesson(1)['type'] == 'photo'
+    assert BotData.get_lesson(2) is None
+
+
+def test_reports_are_numbered_per_lesson():
+    report = {'user_id': '2', 'text': 'готово', 'timestamp': '2025-06-02T10:00:00', 'status': 'pending'}
+
+    assert BotData.add_report(1, report) == 0
+    assert BotData.add_report(1, report) == 1
+    assert BotData.add_report(2, report) == 0
+    assert BotData.set_report_status(1, 1, 'approved')
+    assert not BotData.set_report_status(1, 5, 'approved')
+
+
+def test_reset_clears_data():
+    BotData.save_user('1', 'mother', 'Мама')
+    BotData.next_lesson_number()
+
+    BotData.reset()
+
+    assert BotData.get_user('1') is None
+    assert BotData.next_lesson_number() == 1
+
+
+def test_lesson_numbers_are_unique_across_processes():
+    BotData.connect()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=take_lesson_numbers, args=(50, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    numbers = sum((results.get(timeout=30) for _ in workers), [])
+    for worker in workers:
+        worker.join()
+
+    assert sorted(numbers) == list(range(1, 201))
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from autonomous_learner import BotData, SqlitePersistence, CONVERSATION_TTL, REPORT_TEXT
+from conftest import reopen_db
+
+
+def test_conversations_survive_new_persistence_instance():
+    async def scenario():
+        await SqlitePersistence().update_conversation('main_conversation', (42, 42), REPORT_TEXT)
+        await SqlitePersistence().update_conversation('main_conversation', (7, 7), REPORT_TEXT)
+        await SqlitePersistence().update_conversation('main_conversation', (7, 7), None)
+        # Новый процесс (другое число рабочих) видит то же состояние
+        reopen_db()
+        return await SqlitePersistence().get_conversations('main_conversation')
+
+    assert asyncio.run(scenario()) == {(42, 42): REPORT_TEXT}
+
+
+def test_workers_restore_only_their_chats():
+    async def scenario():
+        persistence = SqlitePersistence()
+        for chat_id in [4, 5, -3]:
+            await persistence.update_conversation('main_conversation', (chat_id, chat_id), REPORT_TEXT)
+        return [await SqlitePersistence(worker, 2).get_conversations('main_conversation') for worker in range(2)]
+
+    # Как в worker_for: -3 % 2 == 1
+    assert asyncio.run(scenario()) == [{(4, 4): REPORT_TEXT}, {(5, 5): REPORT_TEXT, (-3, -3): REPORT_TEXT}]
+
+
+def test_stale_conversations_are_not_restored(monkeypatch):
+    async def scenario():
+        persistence = SqlitePersistence()
+        await persistence.update_conversation('main_conversation', (42, 42), REPORT_TEXT)
+        monkeypatch.setattr(time, 'time', lambda: real_time() + CONVERSATION_TTL + 1)
+        restored = await SqlitePersistence().get_conversations('main_conversation')
+        await persistence.flush()
+        remaining = BotData.connect().execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+        return restored, remaining
+
+    real_time = time.time
+    assert asyncio.run(scenario()) == ({}, 0)
+
+
+def test_user_data_is_loaded_on_first_update():
+    async def scenario():
+        persistence = SqlitePersistence()
+        await persistence.refresh_user_data(42, {})
+        await persistence.update_user_data(42, {'report_lesson': 3, 'report_text': 'готово'})
+        await persistence.refresh_user_data(7, {})
+        await persistence.update_user_data(7, {})
+
+        restarted = SqlitePersistence()
+        user_data = {}
+        await restarted.refresh_user_data(42, user_data)
+        # Пользователь, не писавший после перезапуска, не затирает сохраненные данные
+        await restarted.update_user_data(43, {})
+        count = BotData.connect().execute('SELECT COUNT(*) FROM user_data').fetchone()[0]
+        return await restarted.get_user_data(), user_data, count
+
+    assert asyncio.run(scenario()) == ({}, {'report_lesson': 3, 'report_text': 'готово'}, 1)
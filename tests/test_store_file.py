@@ -0,0 +1,60 @@
+import asyncio
+import errno
+import os
+
+from telegram import Bot
+
+import autonomous_learner
+from fake_bot_api import FakeBotApi
+
+TOKEN = '123:TEST'
+CONTENT = b'lesson video'
+
+
+async def store_from_fake_api(tmp_path, local_mode, file_path):
+    """Запрашивает файл у поддельного Bot API и сохраняет его через store_file"""
+    async with FakeBotApi(tmp_path / 'server', local_mode=local_mode) as api:
+        source = api.add_file('video_1', CONTENT, 'lesson.mp4')
+        bot = Bot(TOKEN, base_url=f'{api.url}/bot', base_file_url=f'{api.url}/file/bot', local_mode=local_mode)
+        async with bot:
+            await autonomous_learner.store_file(await bot.get_file('video_1'), str(file_path))
+        return api, source
+
+
+def test_local_mode_hard_links_server_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(autonomous_learner, 'BOT_API_LOCAL_MODE', True)
+    file_path = tmp_path / 'lesson.mp4'
+    file_path.write_bytes(b'previous upload')
+
+    api, source = asyncio.run(store_from_fake_api(tmp_path, True, file_path))
+
+    assert os.path.samefile(source, file_path)
+    assert file_path.read_bytes() == CONTENT
+    assert api.downloads == []
+
+
+def test_local_mode_moves_file_across_filesystems(tmp_path, monkeypatch):
+    monkeypatch.setattr(autonomous_learner, 'BOT_API_LOCAL_MODE', True)
+
+    def cross_device_link(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, 'link', cross_device_link)
+    file_path = tmp_path / 'lesson.mp4'
+
+    api, source = asyncio.run(store_from_fake_api(tmp_path, True, file_path))
+
+    assert not os.path.exists(source)
+    assert file_path.read_bytes() == CONTENT
+    assert api.downloads == []
+
+
+def test_hosted_mode_downloads_over_http(tmp_path, monkeypatch):
+    monkeypatch.setattr(autonomous_learner, 'BOT_API_LOCAL_MODE', False)
+    file_path = tmp_path / 'lesson.mp4'
+
+    api, source = asyncio.run(store_from_fake_api(tmp_path, False, file_path))
+
+    assert file_path.read_bytes() == CONTENT
+    assert not os.path.samefile(source, file_path)
+    assert api.downloads == [source]
@@ -0,0 +1,85 @@
+import asyncio
+import sqlite3
+import time
+
+from telegram import Bot, Update
+
+from autonomous_learner import DB_FILE, worker_for
+from fake_bot_api import FakeBotApi, ROLE_REPLY, spawn_bot, stop_bot
+
+
+def make_update(payload):
+    return Update.de_json({'update_id': 1, **payload}, Bot('123:TEST'))
+
+
+def message(chat_id):
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'user'}
+    return {'message': {'message_id': 1, 'date': int(time.time()), 'text': 'hi',
+                        'chat': {'id': chat_id, 'type': 'private'}, 'from': user}}
+
+
+def callback(chat_id):
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'user'}
+    return {'callback_query': {'id': '1', 'from': user, 'chat_instance': '1', 'data': 'son',
+                               **message(chat_id)}}
+
+
+def test_updates_of_a_chat_go_to_one_worker():
+    for chat_id in [1, 2, 3, 10 ** 9, -100123]:
+        indexes = {worker_for(make_update(payload), 4) for payload in [message(chat_id), callback(chat_id)]}
+        assert len(indexes) == 1
+        assert 0 <= indexes.pop() < 4
+
+    assert {worker_for(make_update(message(chat_id)), 4) for chat_id in range(8)} == {0, 1, 2, 3}
+
+
+def test_conversation_continues_after_switching_to_workers(tmp_path):
+    chats = [2, 3, 4, 5]
+
+    async def scenario():
+        async with FakeBotApi(tmp_path / 'api') as api:
+            # Диалог начат в одном процессе...
+            bot = await spawn_bot(api, tmp_path)
+            for chat_id in chats:
+                api.send_text(chat_id, '/start')
+            await api.wait_for(lambda: all(api.sent(chat_id=chat_id) for chat_id in chats), timeout=30)
+            assert await stop_bot(bot) == 0
+
+            # ...и продолжен в двух рабочих процессах
+            bot = await spawn_bot(api, tmp_path, BOT_WORKERS='2')
+            try:
+                for chat_id in chats:
+                    api.press_button(chat_id, 'son')
+                await api.wait_for(lambda: all(api.replied(chat_id, ROLE_REPLY) for chat_id in chats), timeout=30)
+            finally:
+                assert await stop_bot(bot) == 0
+
+    asyncio.run(scenario())
+
+
+def test_killed_bot_keeps_conversation_state(tmp_path):
+    def conversation_saved():
+        db = sqlite3.connect(tmp_path / DB_FILE)
+        try:
+            return db.execute('SELECT COUNT(*) FROM conversations').fetchone()[0] > 0
+        finally:
+            db.close()
+
+    async def scenario():
+        async with FakeBotApi(tmp_path / 'api') as api:
+            bot = await spawn_bot(api, tmp_path)
+            api.send_text(2, '/start')
+            await api.wait_for(lambda: api.sent(chat_id=2), timeout=30)
+            # Состояние пишется сразу после обновления, а не периодической задачей
+            await api.wait_for(conversation_saved, timeout=0.5)
+            bot.kill()
+            await bot.wait()
+
+            bot = await spawn_bot(api, tmp_path)
+            try:
+                api.press_button(2, 'son')
+                await api.wait_for(lambda: api.replied(2, ROLE_REPLY), timeout=30)
+            finally:
+                await stop_bot(bot)
+
+    asyncio.run(scenario())